@@ -0,0 +1,12 @@
+"""
+Gunicorn configuration for OHS Insider Bridge integration.
+
+Usage: gunicorn ohsinsider.wsgi
+"""
+import multiprocessing
+import os
+
+# Load Django once in the master; workers share it copy-on-write after fork
+preload_app = True
+
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
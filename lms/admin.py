@@ -1,6 +1,8 @@
 """
 Admin configuration for OHS Insider LMS models.
 """
+import ipaddress
+
 from django.contrib import admin
 from .models import OHSAccount, OHSAuth, OHSAccessLog, BridgeSyncTask, OAuthAuthorizationCode, OAuthAccessToken
 
@@ -25,15 +27,26 @@ class OHSAuthAdmin(admin.ModelAdmin):
 @admin.register(OHSAccessLog)
 class OHSAccessLogAdmin(admin.ModelAdmin):
     list_display = ['account', 'access_time', 'ip_address', 'success']
+    list_select_related = ['account']
     list_filter = ['success', 'access_time']
-    search_fields = ['account__unique_id', 'account__user_email', 'ip_address']
+    search_fields = ['account__unique_id', 'account__user_email']
     readonly_fields = ['access_time']
     ordering = ['-access_time']
 
+    def get_search_results(self, request, queryset, search_term):
+        # IP addresses are matched exactly so the lookup can use the ip_address index
+        term = search_term.strip()
+        try:
+            ipaddress.ip_address(term)
+        except ValueError:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(ip_address=term), False
+
 
 @admin.register(BridgeSyncTask)
 class BridgeSyncTaskAdmin(admin.ModelAdmin):
     list_display = ['account', 'task_type', 'status', 'created_at', 'completed_at']
+    list_select_related = ['account']
     list_filter = ['task_type', 'status', 'created_at']
     search_fields = ['account__unique_id', 'account__user_email']
     readonly_fields = ['created_at', 'started_at', 'completed_at']
@@ -42,17 +55,19 @@ class BridgeSyncTaskAdmin(admin.ModelAdmin):
 
 @admin.register(OAuthAuthorizationCode)
 class OAuthAuthorizationCodeAdmin(admin.ModelAdmin):
-    list_display = ['code', 'account', 'client_id', 'used', 'created_at', 'expires_at']
+    list_display = ['account', 'client_id', 'used', 'created_at', 'expires_at', 'used_at']
+    list_select_related = ['account']
     list_filter = ['used', 'created_at', 'expires_at']
-    search_fields = ['code', 'account__unique_id', 'account__user_email']
-    readonly_fields = ['created_at', 'expires_at']
+    search_fields = ['account__unique_id', 'account__user_email']
+    readonly_fields = ['created_at', 'expires_at', 'used_at']
     ordering = ['-created_at']
 
 
 @admin.register(OAuthAccessToken)
 class OAuthAccessTokenAdmin(admin.ModelAdmin):
-    list_display = ['token', 'account', 'client_id', 'created_at', 'expires_at']
+    list_display = ['account', 'client_id', 'created_at', 'expires_at']
+    list_select_related = ['account']
     list_filter = ['created_at', 'expires_at']
-    search_fields = ['token', 'account__unique_id', 'account__user_email']
+    search_fields = ['account__unique_id', 'account__user_email']
     readonly_fields = ['created_at', 'expires_at']
     ordering = ['-created_at']
@@ -0,0 +1,12 @@
+"""
+App configuration for OHS Insider LMS.
+"""
+from django.apps import AppConfig
+
+
+class LmsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'lms'
+
+    def ready(self):
+        from . import signals  # noqa: F401
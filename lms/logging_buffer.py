@@ -0,0 +1,103 @@
+"""
+Buffered writer for OHS access logs.
+
+Views enqueue unsaved OHSAccessLog instances instead of inserting them in the
+request/response path; a daemon thread flushes them with bulk_create.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# A batch is written once it has this many rows or FLUSH_INTERVAL seconds
+# after its first row arrived, whichever comes first
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 0.5
+
+access_log_queue = queue.Queue()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _drain():
+    """Collect up to BATCH_SIZE queued entries without blocking."""
+    batch = []
+    while len(batch) < BATCH_SIZE:
+        try:
+            batch.append(access_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _collect(first):
+    """Gather entries after first until the batch is full or FLUSH_INTERVAL has passed."""
+    batch = [first]
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(batch) < BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(access_log_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(batch):
+    """Insert a batch of access logs in a single bulk_create."""
+    from .models import OHSAccessLog
+
+    if not batch:
+        return
+    try:
+        OHSAccessLog.objects.bulk_create(batch, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    except Exception:
+        logger.exception('Failed to write %d access log entries', len(batch))
+
+
+def _run():
+    while True:
+        batch = _collect(access_log_queue.get())
+        close_old_connections()
+        _write(batch)
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name='ohs-access-log', daemon=True)
+            _worker.start()
+
+
+def enqueue(entry):
+    """Queue an unsaved OHSAccessLog for the background writer."""
+    # The row may be written FLUSH_INTERVAL or more later; record the access now
+    entry.access_time = timezone.now()
+    if connection.vendor == 'sqlite':
+        # SQLite allows one writer at a time; a second writing connection can
+        # make concurrent request transactions fail with "database is locked"
+        entry.save()
+        return
+    _ensure_worker()
+    access_log_queue.put(entry)
+
+
+def flush():
+    """Write everything still queued from the calling thread."""
+    while not access_log_queue.empty():
+        _write(_drain())
+
+
+atexit.register(flush)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0002_oauthauthorizationcode_oauthaccesstoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bridgesynctask',
+            index=models.Index(fields=['-created_at'], name='bridge_sync_created_0c33cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bridgesynctask',
+            index=models.Index(fields=['status', '-created_at'], name='bridge_sync_status_9b149c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ohsaccesslog',
+            index=models.Index(fields=['-access_time'], name='ohs_access__access__836aa4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ohsaccesslog',
+            index=models.Index(fields=['account', '-access_time'], name='ohs_access__account_729948_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0003_access_log_sync_task_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='oauthauthorizationcode',
+            name='code',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='oauthauthorizationcode',
+            index=models.Index(condition=models.Q(('used', False)), fields=['code'], name='oauth_code_unused_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:20
+
+import hashlib
+
+from django.db import migrations, models
+
+import lms.models
+
+
+def _digest(value):
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+
+
+def hash_existing(apps, schema_editor):
+    OAuthAuthorizationCode = apps.get_model('lms', 'OAuthAuthorizationCode')
+    OAuthAccessToken = apps.get_model('lms', 'OAuthAccessToken')
+    for auth_code in OAuthAuthorizationCode.objects.all():
+        auth_code.code_hash = _digest(auth_code.code)
+        auth_code.save(update_fields=['code_hash'])
+    for access_token in OAuthAccessToken.objects.all():
+        access_token.token_hash = _digest(access_token.token)
+        access_token.save(update_fields=['token_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0004_oauth_code_partial_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='oauthauthorizationcode',
+            name='code_hash',
+            field=lms.models.DigestField(max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='oauthaccesstoken',
+            name='token_hash',
+            field=lms.models.DigestField(max_length=16, null=True),
+        ),
+        migrations.RunPython(hash_existing, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='oauthauthorizationcode',
+            name='oauth_code_unused_idx',
+        ),
+        migrations.RemoveField(
+            model_name='oauthauthorizationcode',
+            name='code',
+        ),
+        migrations.RemoveField(
+            model_name='oauthaccesstoken',
+            name='token',
+        ),
+        migrations.AlterField(
+            model_name='oauthauthorizationcode',
+            name='code_hash',
+            field=lms.models.DigestField(max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='oauthaccesstoken',
+            name='token_hash',
+            field=lms.models.DigestField(max_length=16, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='oauthauthorizationcode',
+            index=models.Index(condition=models.Q(('used', False)), fields=['code_hash'], name='oauth_code_unused_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0005_hash_oauth_codes_and_tokens'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='oauthauthorizationcode',
+            name='oauth_code_unused_idx',
+        ),
+        migrations.AddIndex(
+            model_name='oauthauthorizationcode',
+            index=models.Index(condition=models.Q(('used', False)), fields=['code_hash', 'expires_at'], name='oauth_code_unused_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:10
+
+from django.db import migrations, models
+import lms.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0006_oauth_code_unused_idx_expires_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='oauthaccesstoken',
+            name='expires_at',
+            field=models.DateTimeField(default=lms.models.OAuthAccessToken.default_expires_at),
+        ),
+        migrations.AlterField(
+            model_name='oauthauthorizationcode',
+            name='expires_at',
+            field=models.DateTimeField(default=lms.models.OAuthAuthorizationCode.default_expires_at),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0007_oauth_expires_at_defaults'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ohsaccesslog',
+            name='ip_address',
+            field=models.GenericIPAddressField(db_index=True),
+        ),
+    ]
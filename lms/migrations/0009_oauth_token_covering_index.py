@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-15 23:05
+
+from django.db import migrations
+
+
+# Covering index so the userinfo lookup by token_hash is answered from the
+# index alone. INCLUDE is PostgreSQL-only; on SQLite the unique index on
+# token_hash is all there is, so nothing is created there.
+COVERING_INDEX = 'oauth_token_covering_idx'
+
+
+def create_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {COVERING_INDEX} '
+        'ON oauth_access_token (token_hash) INCLUDE (account_id, expires_at)'
+    )
+
+
+def drop_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {COVERING_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0008_ohsaccesslog_ip_address_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_covering_index, drop_covering_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0009_oauth_token_covering_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='oauthauthorizationcode',
+            name='used_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
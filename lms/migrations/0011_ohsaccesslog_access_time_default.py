@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0010_oauthauthorizationcode_used_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ohsaccesslog',
+            name='access_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -2,10 +2,25 @@
 Models for OHS Insider Bridge integration.
 """
 import secrets
+from datetime import timedelta
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+class DigestField(models.BinaryField):
+    """
+    Fixed-size binary digest. Stored as BINARY(max_length) on MySQL, whose
+    default LONGBLOB for BinaryField cannot be indexed without a prefix length.
+    """
+
+    def db_type(self, connection):
+        if connection.vendor == 'mysql':
+            return f'binary({self.max_length})'
+        return super().db_type(connection)
+
+
 class OHSAccount(models.Model):
     """
     OHS Insider account linking unique IDs to Bridge subaccounts.
@@ -84,8 +99,9 @@ class OHSAccessLog(models.Model):
     Log of user access attempts to Bridge LMS.
     """
     account = models.ForeignKey(OHSAccount, on_delete=models.CASCADE, related_name='access_logs')
-    access_time = models.DateTimeField(auto_now_add=True)
-    ip_address = models.GenericIPAddressField()
+    # Stamped when the access is logged, not when the buffered row is written
+    access_time = models.DateTimeField(default=timezone.now)
+    ip_address = models.GenericIPAddressField(db_index=True)
     user_agent = models.TextField(blank=True)
     success = models.BooleanField(default=True)
     error_message = models.TextField(blank=True)
@@ -93,6 +109,10 @@ class OHSAccessLog(models.Model):
     class Meta:
         db_table = 'ohs_access_log'
         ordering = ['-access_time']
+        indexes = [
+            models.Index(fields=['-access_time']),
+            models.Index(fields=['account', '-access_time']),
+        ]
         verbose_name = 'OHS Access Log'
         verbose_name_plural = 'OHS Access Logs'
     
@@ -103,32 +123,54 @@ class OHSAccessLog(models.Model):
 class OAuthAuthorizationCode(models.Model):
     """
     Store OAuth2 authorization codes for token exchange.
+    Only a BLAKE2b digest of the code is kept; the raw value goes to the client.
     """
-    code = models.CharField(max_length=100, unique=True, db_index=True)
+    LIFETIME = timedelta(minutes=5)
+
+    def default_expires_at():
+        return timezone.now() + OAuthAuthorizationCode.LIFETIME
+
+    code_hash = DigestField(max_length=16)
     account = models.ForeignKey(OHSAccount, on_delete=models.CASCADE)
     client_id = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(default=default_expires_at)
     used = models.BooleanField(default=False)
+    used_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'oauth_authorization_code'
+        # Only unused codes are ever looked up; redeemed ones drop out of the index.
+        # expires_at is included so the whole redemption predicate is answered by it.
+        indexes = [
+            models.Index(
+                fields=['code_hash', 'expires_at'],
+                condition=models.Q(used=False),
+                name='oauth_code_unused_idx',
+            ),
+        ]
         verbose_name = 'OAuth Authorization Code'
         verbose_name_plural = 'OAuth Authorization Codes'
     
     def __str__(self):
-        return f"{self.code} - {self.account.unique_id}"
+        return f"{self.account.unique_id} - {self.created_at}"
 
 
 class OAuthAccessToken(models.Model):
     """
     Store OAuth2 access tokens for userinfo requests.
+    Only a BLAKE2b digest of the token is kept; the raw value goes to the client.
     """
-    token = models.CharField(max_length=100, unique=True, db_index=True)
+    LIFETIME = timedelta(hours=1)
+
+    def default_expires_at():
+        return timezone.now() + OAuthAccessToken.LIFETIME
+
+    token_hash = DigestField(max_length=16, unique=True)
     account = models.ForeignKey(OHSAccount, on_delete=models.CASCADE)
     client_id = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(default=default_expires_at)
     
     class Meta:
         db_table = 'oauth_access_token'
@@ -136,7 +178,7 @@ class OAuthAccessToken(models.Model):
         verbose_name_plural = 'OAuth Access Tokens'
     
     def __str__(self):
-        return f"{self.token} - {self.account.unique_id}"
+        return f"{self.account.unique_id} - {self.created_at}"
 
 
 class BridgeSyncTask(models.Model):
@@ -176,6 +218,10 @@ class BridgeSyncTask(models.Model):
     class Meta:
         db_table = 'bridge_sync_task'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['status', '-created_at']),
+        ]
         verbose_name = 'Bridge Sync Task'
         verbose_name_plural = 'Bridge Sync Tasks'
     
@@ -0,0 +1,226 @@
+"""
+Shared lookups for OHS Insider Bridge views.
+"""
+import functools
+import hashlib
+import secrets
+import time
+
+import orjson
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import OHSAccount, OHSAuth, OAuthAuthorizationCode, OAuthAccessToken
+
+# OHSAuth lookups are cached in the default (per-process) cache. The save/delete
+# signal only clears the saving process's copy, so the timeouts bound how long
+# other workers keep using a rotated secret or deactivated credentials.
+ACTIVE_AUTH_CACHE_KEY = 'ohs_auth_active'
+ACTIVE_AUTH_CACHE_TIMEOUT = 60
+
+# Per-client credentials for the token endpoint, keyed by a digest of the client_id
+CLIENT_AUTH_CACHE_KEY = 'ohs_auth_client:{}'
+CLIENT_AUTH_CACHE_TIMEOUT = 60
+
+ACCESS_TOKEN_CLAIMS_CACHE_KEY = 'ohs_token_claims:{}'
+
+# Lifetimes of OIDC credentials, in seconds
+AUTHORIZATION_CODE_TTL = int(OAuthAuthorizationCode.LIFETIME.total_seconds())
+ACCESS_TOKEN_TTL = int(OAuthAccessToken.LIFETIME.total_seconds())
+
+# OHSAccount columns userinfo() turns into claims
+CLAIM_FIELDS = ('unique_id', 'user_email', 'first_name', 'last_name')
+
+# Redis keys, formatted with the hex digest of the code/token (never the raw value).
+# Values are compact JSON: aid = account id, cid = client id, exp = expiry timestamp
+AUTHORIZATION_CODE_KEY = 'ohsinsider:oidc:code:{}'
+ACCESS_TOKEN_KEY = 'ohsinsider:oidc:token:{}'
+
+# Connections kept per worker process for the Redis store
+REDIS_MAX_CONNECTIONS = 32
+REDIS_POOL_TIMEOUT = 2
+
+# Atomic redemption on backends with UPDATE ... RETURNING. The predicate is
+# written as NOT used, the form of oauth_code_unused_idx's condition; SQLite
+# cannot match the partial index to used = FALSE and scans the table instead
+REDEEM_AUTHORIZATION_CODE_SQL = (
+    f'UPDATE {OAuthAuthorizationCode._meta.db_table} SET used = %s, used_at = %s '
+    'WHERE code_hash = %s AND NOT used AND expires_at > %s '
+    'RETURNING account_id'
+)
+
+
+def get_active_auth():
+    """
+    Return the active OHSAuth, cached for ACTIVE_AUTH_CACHE_TIMEOUT seconds.
+    Saving or deleting an OHSAuth clears the cache in the current process only.
+    """
+    auth = cache.get(ACTIVE_AUTH_CACHE_KEY)
+    if auth is None:
+        auth = OHSAuth.objects.filter(is_active=True).first()
+        if auth:
+            cache.set(ACTIVE_AUTH_CACHE_KEY, auth, ACTIVE_AUTH_CACHE_TIMEOUT)
+    return auth
+
+
+def get_client_auth(client_id):
+    """Return the active OHSAuth for client_id (or None), cached briefly."""
+    key = CLIENT_AUTH_CACHE_KEY.format(token_digest(client_id).hex())
+    auth = cache.get(key)
+    if auth is None:
+        auth = OHSAuth.objects.filter(client_id=client_id, is_active=True).first()
+        if auth:
+            cache.set(key, auth, CLIENT_AUTH_CACHE_TIMEOUT)
+    return auth
+
+
+def clear_active_auth(client_id=None):
+    """Drop this process's cached OHSAuth so its next lookup hits the database."""
+    keys = [ACTIVE_AUTH_CACHE_KEY]
+    if client_id:
+        keys.append(CLIENT_AUTH_CACHE_KEY.format(token_digest(client_id).hex()))
+    cache.delete_many(keys)
+
+
+def token_digest(value):
+    """Return the 16-byte digest under which a code or token is stored."""
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+
+
+@functools.lru_cache(maxsize=1)
+def get_redis():
+    """Return a Redis client backed by one blocking connection pool per process."""
+    pool = redis.BlockingConnectionPool(
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        **settings.REDIS
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def _use_redis():
+    return settings.OHS_OAUTH_STORE == 'redis'
+
+
+def issue_authorization_code(account, client_id):
+    """Create a single-use authorization code for the account."""
+    code = secrets.token_urlsafe(16)
+    if _use_redis():
+        get_redis().setex(
+            AUTHORIZATION_CODE_KEY.format(token_digest(code).hex()),
+            AUTHORIZATION_CODE_TTL,
+            orjson.dumps({'aid': account.id, 'cid': client_id})
+        )
+    else:
+        OAuthAuthorizationCode.objects.create(
+            code_hash=token_digest(code),
+            account=account,
+            client_id=client_id
+        )
+    return code
+
+
+def redeem_authorization_code(code):
+    """
+    Consume an authorization code.
+    Returns the account id it was issued for, or None if it is unknown,
+    expired or already used.
+    """
+    if _use_redis():
+        # GETDEL reads and consumes the code in one atomic round-trip
+        payload = get_redis().getdel(AUTHORIZATION_CODE_KEY.format(token_digest(code).hex()))
+        return orjson.loads(payload)['aid'] if payload else None
+
+    now = timezone.now()
+    if _can_update_returning():
+        # Validate and consume in one statement; a concurrent redemption
+        # of the same code finds used = TRUE and gets no row back
+        db_now = connection.ops.adapt_datetimefield_value(now)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                REDEEM_AUTHORIZATION_CODE_SQL,
+                [True, db_now, token_digest(code), db_now]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    # No UPDATE ... RETURNING (MySQL): consume the code with a conditional
+    # UPDATE whose row count settles concurrent redemptions, then read the
+    # owner back from the row this call just marked used
+    digest = token_digest(code)
+    if not OAuthAuthorizationCode.objects.filter(
+        code_hash=digest,
+        used=False,
+        expires_at__gt=now
+    ).update(used=True, used_at=now):
+        return None
+    return OAuthAuthorizationCode.objects.filter(
+        code_hash=digest
+    ).values_list('account_id', flat=True).first()
+
+
+def _can_update_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    # SQLite supports RETURNING from 3.35, the same release as INSERT ... RETURNING
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+
+
+def issue_access_token(account_id, client_id):
+    """Create a bearer access token for the account."""
+    access_token = secrets.token_urlsafe(16)
+    if _use_redis():
+        get_redis().setex(
+            ACCESS_TOKEN_KEY.format(token_digest(access_token).hex()),
+            ACCESS_TOKEN_TTL,
+            orjson.dumps({'aid': account_id, 'cid': client_id, 'exp': time.time() + ACCESS_TOKEN_TTL})
+        )
+    else:
+        OAuthAccessToken.objects.create(
+            token_hash=token_digest(access_token),
+            account_id=account_id,
+            client_id=client_id
+        )
+    return access_token
+
+
+def get_access_token_claims(access_token):
+    """
+    Return the claim fields (CLAIM_FIELDS) of the account an unexpired access
+    token belongs to, or None. Claims are cached until the token expires.
+    """
+    digest = token_digest(access_token)
+    cache_key = ACCESS_TOKEN_CLAIMS_CACHE_KEY.format(digest.hex())
+    claims = cache.get(cache_key)
+    if claims is None:
+        account, expires_in = _load_access_token(digest)
+        if account is None or expires_in <= 0:
+            return None
+        claims = {field: getattr(account, field) for field in CLAIM_FIELDS}
+        cache.set(cache_key, claims, expires_in)
+    return claims
+
+
+def _load_access_token(digest):
+    """Return (account, seconds until expiry) for a token digest, or (None, 0)."""
+    if _use_redis():
+        payload = get_redis().get(ACCESS_TOKEN_KEY.format(digest.hex()))
+        if not payload:
+            return None, 0
+        data = orjson.loads(payload)
+        account = OHSAccount.objects.only(*CLAIM_FIELDS).filter(id=data['aid']).first()
+        return account, data['exp'] - time.time()
+
+    try:
+        access_token = OAuthAccessToken.objects.select_related('account').only(
+            'account', 'expires_at', *(f'account__{field}' for field in CLAIM_FIELDS)
+        ).get(
+            token_hash=digest,
+            expires_at__gt=timezone.now()
+        )
+    except OAuthAccessToken.DoesNotExist:
+        return None, 0
+    return access_token.account, (access_token.expires_at - timezone.now()).total_seconds()
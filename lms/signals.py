@@ -0,0 +1,14 @@
+"""
+Signal handlers for OHS Insider LMS models.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import OHSAuth
+from .services import clear_active_auth
+
+
+@receiver(post_save, sender=OHSAuth)
+@receiver(post_delete, sender=OHSAuth)
+def invalidate_active_auth(sender, instance, **kwargs):
+    clear_active_auth(instance.client_id)
@@ -4,20 +4,21 @@ Views for OHS Insider Bridge authentication.
 import hashlib
 import hmac
 import time
-import json
 import base64
-from urllib.parse import urlencode, quote
+from urllib.parse import urlencode, quote, parse_qsl
 
+import orjson
 from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
-from django.contrib.auth import login as auth_login
-from django.contrib.auth.models import User
 
-from .models import OHSAccount, OHSAuth, OHSAccessLog, BridgeSyncTask
+from . import logging_buffer
+from .models import OHSAccount, OHSAccessLog, BridgeSyncTask
+from .services import get_active_auth
 
 
 def get_client_ip(request):
@@ -30,38 +31,60 @@ def get_client_ip(request):
     return ip
 
 
+def update_changed_fields(instance, values):
+    """Set the given attributes on instance and return the names of those that changed."""
+    changed = [field for field, value in values.items() if getattr(instance, field) != value]
+    for field in changed:
+        setattr(instance, field, values[field])
+    return changed
+
+
+# Login notifications carry a handful of short fields; anything bigger is refused unparsed
+MAX_NOTIFICATION_BYTES = 8192
+
+# Columns needed to log an access and build the Bridge redirect for an account
+REDIRECT_ACCOUNT_FIELDS = ('id', 'bridge_subaccount_id')
+
+# Keyed HMAC-SHA256 objects per client secret; copying one skips re-deriving the key pads
+_HMAC_CACHE = {}
+
+
+def compute_signature(message, secret):
+    """Return the hex HMAC-SHA256 of message under secret."""
+    base = _HMAC_CACHE.get(secret)
+    if base is None:
+        base = _HMAC_CACHE[secret] = hmac.new(secret.encode('utf-8'), b'', hashlib.sha256)
+    h = base.copy()
+    h.update(message.encode('utf-8'))
+    return h.hexdigest()
+
+
+def canonical_querystring(data):
+    """Encode data with its keys sorted, so the signed string does not depend on key order."""
+    return urlencode(sorted(data.items()), doseq=True)
+
+
 def sign_token(data, secret):
     """Create HMAC signature for token data."""
     querystring = urlencode(data, doseq=True)
-    signature = hmac.new(
-        secret.encode('utf-8'),
-        querystring.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
+    signature = compute_signature(querystring, secret)
     return f"{querystring}&signature={signature}"
 
 
 def verify_token(token, secret):
     """Verify HMAC signature for token."""
     try:
-        querystring, signature = token.rsplit('&signature=')
-        expected_signature = hmac.new(
-            secret.encode('utf-8'),
-            querystring.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        
-        if signature != expected_signature:
+        querystring, _, signature = token.rpartition('&signature=')
+        if not querystring:
+            return None
+        expected_signature = compute_signature(querystring, secret)
+        
+        if not hmac.compare_digest(signature, expected_signature):
             return None
             
         # Parse the querystring back to dict
-        data = {}
-        for pair in querystring.split('&'):
-            if '=' in pair:
-                key, value = pair.split('=', 1)
-                data[key] = value
-        return data
-    except:
+        return dict(parse_qsl(querystring, keep_blank_values=True))
+    except (ValueError, TypeError):
         return None
 
 
@@ -72,33 +95,40 @@ def wordpress_login_notification(request):
     Handle login notifications from OHS Insider WordPress.
     """
     try:
+        if int(request.META.get('CONTENT_LENGTH') or 0) > MAX_NOTIFICATION_BYTES:
+            return HttpResponseBadRequest('Request too large')
+        
         # Get authentication credentials
-        auth = OHSAuth.objects.filter(is_active=True).first()
+        auth = get_active_auth()
         if not auth:
             return HttpResponseBadRequest('No active authentication configured')
         
         # Parse the request data
-        data = json.loads(request.body)
+        data = orjson.loads(request.body)
         
         # Verify the signature
         signature = data.get('signature')
         if not signature:
             return HttpResponseBadRequest('Missing signature')
         
-        # Create the data string for verification
+        if not isinstance(signature, str):
+            return HttpResponseBadRequest('Invalid signature')
+        
+        # Create the data string for verification (keys sorted)
         data_copy = data.copy()
         data_copy.pop('signature', None)
-        data_string = urlencode(data_copy, doseq=True)
+        data_string = canonical_querystring(data_copy)
         
         # Verify signature
-        expected_signature = hmac.new(
-            auth.client_secret.encode('utf-8'),
-            data_string.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        expected_signature = compute_signature(data_string, auth.client_secret)
         
-        if signature != expected_signature:
-            return HttpResponseBadRequest('Invalid signature')
+        if not hmac.compare_digest(signature, expected_signature):
+            # Older plugin versions sign the fields in payload order
+            legacy_string = urlencode(data_copy, doseq=True)
+            if legacy_string == data_string or not hmac.compare_digest(
+                signature, compute_signature(legacy_string, auth.client_secret)
+            ):
+                return HttpResponseBadRequest('Invalid signature')
         
         # Check timestamp (within 5 minutes)
         timestamp = int(data.get('timestamp', 0))
@@ -121,26 +151,34 @@ def wordpress_login_notification(request):
         )
         
         if not created:
-            # Update existing account
-            account.user_email = data.get('email', account.user_email)
-            account.first_name = data.get('first_name', account.first_name)
-            account.last_name = data.get('last_name', account.last_name)
-            account.bridge_subaccount_id = data.get('bridge_subaccount_id', account.bridge_subaccount_id)
-            account.save()
-        
-        # Log the access
-        OHSAccessLog.objects.create(
-            account=account,
-            ip_address=get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', ''),
-            success=True
-        )
+            # Update existing account, writing only the fields that changed
+            changed = update_changed_fields(account, {
+                'user_email': data.get('email', account.user_email),
+                'first_name': data.get('first_name', account.first_name),
+                'last_name': data.get('last_name', account.last_name),
+                'bridge_subaccount_id': data.get('bridge_subaccount_id', account.bridge_subaccount_id),
+            })
+            if changed:
+                account.save(update_fields=changed + ['updated_at'])
         
-        # Queue sync task
-        BridgeSyncTask.objects.create(
-            account=account,
-            task_type=BridgeSyncTask.TASK_TYPE_USER
-        )
+        # Insert the sync task and log in one transaction. The account upsert stays
+        # in autocommit: on SQLite a transaction that reads first cannot upgrade
+        # to a write lock under concurrency and fails with "database is locked"
+        with transaction.atomic():
+            # Queue sync task
+            BridgeSyncTask.objects.create(
+                account=account,
+                task_type=BridgeSyncTask.TASK_TYPE_USER
+            )
+            
+            # Log the access once the sync task is committed
+            access_log = OHSAccessLog(
+                account=account,
+                ip_address=get_client_ip(request),
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                success=True
+            )
+            transaction.on_commit(lambda: logging_buffer.enqueue(access_log))
         
         return HttpResponse('OK')
         
@@ -151,44 +189,22 @@ def wordpress_login_notification(request):
 def authenticate_user(request, unique_id):
     """
     Authenticate user and redirect to Bridge LMS.
-    Creates Django user if needed and logs them in for OIDC flow.
+    Stores the account in the session for the OIDC authorize endpoint.
     """
     try:
-        account = get_object_or_404(OHSAccount, unique_id=unique_id, is_active=True)
+        account = OHSAccount.objects.only(*REDIRECT_ACCOUNT_FIELDS).get(unique_id=unique_id, is_active=True)
         
         # Log the access attempt
-        OHSAccessLog.objects.create(
+        logging_buffer.enqueue(OHSAccessLog(
             account=account,
             ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             success=True
-        )
-        
-        # Get or create Django User for OIDC authentication
-        django_user, created = User.objects.get_or_create(
-            username=account.unique_id,
-            defaults={
-                'email': account.user_email,
-                'first_name': account.first_name,
-                'last_name': account.last_name,
-            }
-        )
-        
-        if not created:
-            # Update existing user
-            django_user.email = account.user_email
-            django_user.first_name = account.first_name
-            django_user.last_name = account.last_name
-            django_user.save()
-        
-        # Log the user into Django (required for OIDC authorize endpoint)
-        auth_login(request, django_user)
+        ))
         
         # Store account info in session for OIDC endpoint
-        # Also store in a way that persists across domain redirects
+        # (saved by the session middleware when the response goes out)
         request.session['ohs_account_id'] = account.id
-        request.session['ohs_unique_id'] = account.unique_id
-        request.session.save()  # Ensure session is saved
         
         # Build Bridge subaccount URL
         bridge_subdomain = account.bridge_subaccount_id
@@ -196,7 +212,7 @@ def authenticate_user(request, unique_id):
         # Redirect directly to Bridge learner courses page
         # Bridge will detect external auth configured and trigger OIDC flow automatically
         # This bypasses the /login endpoint which has 503 issues
-        # We rely on session data (ohs_account_id, ohs_unique_id) stored above
+        # We rely on session data (ohs_account_id) stored above
         # The session should persist across the redirect to Bridge
         bridge_url = f"https://{bridge_subdomain}.bridgeapp.com/learner/courses"
         
@@ -221,7 +237,7 @@ def bridge_sso_callback(request):
         decoded_token = base64.b64decode(token.encode('utf-8')).decode('utf-8')
         
         # Verify the token
-        auth = OHSAuth.objects.filter(is_active=True).first()
+        auth = get_active_auth()
         if not auth:
             return HttpResponseBadRequest('Authentication not configured')
         
@@ -230,20 +246,22 @@ def bridge_sso_callback(request):
             return HttpResponseBadRequest('Invalid token')
         
         # Get the account
-        account = get_object_or_404(OHSAccount, unique_id=user_data['user_id'])
+        account = OHSAccount.objects.only(*REDIRECT_ACCOUNT_FIELDS).get(unique_id=user_data['user_id'])
         
         # Log successful authentication
-        OHSAccessLog.objects.create(
+        logging_buffer.enqueue(OHSAccessLog(
             account=account,
             ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             success=True
-        )
+        ))
         
         # Redirect to user's specific subaccount
         subaccount_url = f"{auth.bridge_base_url}/{account.bridge_subaccount_id}/learner/courses"
         return HttpResponseRedirect(subaccount_url)
         
+    except OHSAccount.DoesNotExist:
+        return HttpResponseBadRequest('Account not found')
     except Exception as e:
         return HttpResponseBadRequest(f'Error: {str(e)}')
 
@@ -2,169 +2,170 @@
 OpenID Connect endpoints for OHS Insider Bridge SSO.
 """
 import base64
-import secrets
+import binascii
+import hmac
+import html
+import re
+import string
 import urllib.parse
+from urllib.parse import unquote
 
-import redis
-from django.conf import settings
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponseRedirect, JsonResponse, HttpResponseForbidden, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, HttpResponseForbidden, HttpResponseBadRequest
+from django.utils.html import escapejs
 from django.views.decorators.csrf import csrf_exempt
-from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 
-from .models import OHSAccount, OHSAuth, OAuthAuthorizationCode, OAuthAccessToken
-from django.utils import timezone
-from datetime import timedelta
+from .models import OHSAccount
+from .services import (
+    get_active_auth, get_client_auth, issue_authorization_code, redeem_authorization_code,
+    issue_access_token, get_access_token_claims, ACCESS_TOKEN_TTL,
+)
 
-# Initialize Redis connection (optional - can use database instead)
-try:
-    r = redis.Redis(**settings.REDIS)
-except:
-    r = None
+# authorize() only needs the account's id (for the code) and Bridge subaccount
+_AUTHORIZE_ACCOUNT_FIELDS = ('id', 'bridge_subaccount_id')
 
+# Bridge subdomain in a redirect_uri such as https://acme.bridgeapp.com/...
+_BRIDGE_SUBDOMAIN_RE = re.compile(r'https://([^.]+)\.bridgeapp\.com')
 
-def authorize(request):
-    """
-    OIDC Authorization endpoint.
-    Bridge will call this to initiate OAuth2 flow.
-    """
-    try:
-        client_id = request.GET['client_id']
-        redirect_uri = request.GET['redirect_uri']
-        state = request.GET['state']
-    except KeyError:
-        return HttpResponseBadRequest(f'Incomplete set of parameters for {request.path}')
+# Values from state that may be looked up as an OHSAccount.unique_id
+# (max_length=50); anything else is rejected without touching the database
+_UID_RE = re.compile(r'^[A-Za-z0-9._%+@-]{1,50}$')
 
-    try:
-        # Get account from session (set in authenticate_user)
-        # Session might not persist across domain redirects, so also check state parameter
-        account_id = request.session.get('ohs_account_id')
-        unique_id = request.session.get('ohs_unique_id')
-        
-        # If state parameter contains unique_id (from our redirect), use it
-        if state and not unique_id:
-            # Try to decode unique_id from state (if we passed it)
-            try:
-                from urllib.parse import unquote
-                decoded_state = unquote(state)
-                
-                # Check if state contains unique_id in format: /learner/courses|unique_id
-                if '|' in decoded_state:
-                    parts = decoded_state.split('|', 1)
-                    if len(parts) == 2:
-                        potential_unique_id = parts[1]
-                        account = OHSAccount.objects.filter(unique_id=potential_unique_id).first()
-                        if account:
-                            unique_id = account.unique_id
-                # Otherwise, check if it looks like an email or unique_id
-                elif '@' in decoded_state or len(decoded_state) > 10:
-                    account = OHSAccount.objects.filter(unique_id=decoded_state).first()
-                    if account:
-                        unique_id = account.unique_id
-            except:
-                pass
-        
-        if account_id:
-            account = get_object_or_404(OHSAccount, id=account_id)
-        elif unique_id:
-            account = get_object_or_404(OHSAccount, unique_id=unique_id)
-        else:
-            # Fallback: try to find by logged-in user email (if user was logged in)
-            if request.user.is_authenticated:
-                account = get_object_or_404(OHSAccount, user_email=request.user.email)
-            else:
-                # No session data and user not logged in - return error
-                return HttpResponseForbidden('User session not found. Please start from WordPress login.')
-        
-        # Verify we have an active OHSAuth (for token endpoint later)
-        auth = OHSAuth.objects.filter(is_active=True).first()
-        if not auth:
-            return HttpResponseBadRequest('Authentication not configured')
-        
-        # Generate authorization code
-        code = secrets.token_urlsafe(16)
-        
-        # Store code in database (works for server-to-server token exchange)
-        expires_at = timezone.now() + timedelta(minutes=5)
-        OAuthAuthorizationCode.objects.create(
-            code=code,
-            account=account,
-            client_id=client_id,
-            expires_at=expires_at
-        )
-        
-        # Logout user from Django (security best practice)
-        auth_logout(request)
-        
-        # Check if state parameter contains a path (like /learner/courses)
-        # We need to redirect to Bridge's redirect_uri so Bridge can process the code
-        # But then immediately redirect to courses to avoid the error page
-        from urllib.parse import unquote
-        decoded_state = unquote(state) if state else ''
-        
-        # Extract path from state if it's in format: /learner/courses|unique_id
-        state_path = decoded_state
-        if '|' in decoded_state:
-            state_path = decoded_state.split('|', 1)[0]
-        
-        # If state looks like a path (starts with /), use iframe to process code, then redirect to courses
-        if state_path.startswith('/') and account.bridge_subaccount_id:
-            # Extract subdomain from redirect_uri (more reliable than bridge_subaccount_id)
-            import re
-            subdomain_match = re.search(r'https://([^\.]+)\.bridgeapp\.com', redirect_uri)
-            if subdomain_match:
-                extracted_subdomain = subdomain_match.group(1)
-                # Add -safetynow suffix if not present
-                if '-safetynow' not in extracted_subdomain:
-                    bridge_subdomain = f"{extracted_subdomain}-safetynow"
-                else:
-                    bridge_subdomain = extracted_subdomain
-            else:
-                bridge_subdomain = account.bridge_subaccount_id
-            
-            bridge_courses_url = f"https://{bridge_subdomain}.bridgeapp.com{state_path}"
-            redirect_uri_with_code = f'{redirect_uri}?{urllib.parse.urlencode({"code": code, "state": state})}'
-            
-            # Create HTML page that opens redirect_uri in hidden iframe (so Bridge processes code)
-            # Then immediately redirects main window to courses page
-            html_content = f"""
+# Token endpoint Basic auth header; the scheme is case-insensitive (RFC 7617)
+# and the base64 credentials are capped at 512 characters
+_BASIC_RE = re.compile(r'^Basic ([A-Za-z0-9+/]{1,512}={0,2})$', re.IGNORECASE)
+
+# Page that opens redirect_uri in a hidden iframe (so Bridge processes the code)
+# and immediately redirects the main window to the courses page
+_IFRAME_REDIRECT_TEMPLATE = string.Template("""
             <!DOCTYPE html>
             <html>
             <head>
                 <title>Logging into Bridge...</title>
                 <style>
-                    body {{
+                    body {
                         font-family: Arial, sans-serif;
                         text-align: center;
                         padding: 50px;
-                    }}
+                    }
                 </style>
             </head>
             <body>
                 <h2>Logging you into Bridge...</h2>
                 <p>Please wait...</p>
-                <iframe id="bridgeFrame" style="display:none;" src="{redirect_uri_with_code}"></iframe>
+                <iframe id="bridgeFrame" style="display:none;" src="$iframe"></iframe>
                 <script>
                     // Redirect to courses immediately - Bridge will process code in iframe
-                    window.location.href = "{bridge_courses_url}";
+                    window.location.href = "$redirect";
                 </script>
             </body>
             </html>
-            """
-            from django.http import HttpResponse
-            return HttpResponse(html_content)
+            """)
+
+
+@require_GET
+def authorize(request):
+    """
+    OIDC Authorization endpoint.
+    Bridge will call this to initiate OAuth2 flow.
+    """
+    try:
+        client_id = request.GET['client_id']
+        redirect_uri = request.GET['redirect_uri']
+        state = request.GET['state']
+    except KeyError:
+        return HttpResponseBadRequest(f'Incomplete set of parameters for {request.path}')
+
+    # Get account from session (set in authenticate_user)
+    # Session might not persist across domain redirects, so also check state parameter
+    account_id = request.session.get('ohs_account_id')
+    account = None
+    
+    # If state parameter contains unique_id (from our redirect), use it
+    if state and not account_id:
+        # Try to decode unique_id from state (if we passed it)
+        decoded_state = unquote(state)
+        potential_unique_id = None
         
-        # Fallback: redirect to Bridge's redirect_uri (standard OIDC flow)
-        return HttpResponseRedirect(
-            f'{redirect_uri}?{urllib.parse.urlencode({"code": code, "state": state})}'
-        )
+        # Check if state contains unique_id in format: /learner/courses|unique_id
+        if '|' in decoded_state:
+            potential_unique_id = decoded_state.split('|', 1)[1]
+        # Otherwise, check if it looks like an email or unique_id
+        elif '@' in decoded_state or len(decoded_state) > 10:
+            potential_unique_id = decoded_state
         
-    except (OHSAuth.DoesNotExist, OHSAccount.DoesNotExist):
-        return HttpResponseForbidden('Forbidden')
+        if potential_unique_id and _UID_RE.match(potential_unique_id):
+            account = OHSAccount.objects.only(*_AUTHORIZE_ACCOUNT_FIELDS).filter(
+                unique_id=potential_unique_id
+            ).first()
+    
+    if account_id:
+        try:
+            account = OHSAccount.objects.only(*_AUTHORIZE_ACCOUNT_FIELDS).get(pk=account_id)
+        except OHSAccount.DoesNotExist:
+            # Stale session pointing at a deleted account
+            account = None
+    if account is None:
+        # No session data and no account in state - return error
+        return HttpResponseForbidden('User session not found. Please start from WordPress login.')
+    
+    # Verify we have an active OHSAuth (for token endpoint later)
+    auth = get_active_auth()
+    if not auth:
+        return HttpResponseBadRequest('Authentication not configured')
+    
+    # Generate authorization code (stored server-side for the token exchange)
+    code = issue_authorization_code(account, client_id)
+    
+    # Logout user from Django (security best practice)
+    auth_logout(request)
+    
+    # Check if state parameter contains a path (like /learner/courses)
+    # We need to redirect to Bridge's redirect_uri so Bridge can process the code
+    # But then immediately redirect to courses to avoid the error page
+    decoded_state = unquote(state) if state else ''
+    
+    # Extract path from state if it's in format: /learner/courses|unique_id
+    state_path = decoded_state
+    if '|' in decoded_state:
+        state_path = decoded_state.split('|', 1)[0]
+    
+    # If state looks like a path (starts with /), use iframe to process code, then redirect to courses
+    if state_path.startswith('/') and account.bridge_subaccount_id:
+        # Extract subdomain from redirect_uri (more reliable than bridge_subaccount_id)
+        subdomain_match = _BRIDGE_SUBDOMAIN_RE.search(redirect_uri)
+        if subdomain_match:
+            extracted_subdomain = subdomain_match.group(1)
+            # Add -safetynow suffix if not present
+            if '-safetynow' not in extracted_subdomain:
+                bridge_subdomain = f"{extracted_subdomain}-safetynow"
+            else:
+                bridge_subdomain = extracted_subdomain
+        else:
+            bridge_subdomain = account.bridge_subaccount_id
+        
+        bridge_courses_url = f"https://{bridge_subdomain}.bridgeapp.com{state_path}"
+        redirect_uri_with_code = f'{redirect_uri}?{urllib.parse.urlencode({"code": code, "state": state})}'
+        
+        html_content = _IFRAME_REDIRECT_TEMPLATE.substitute(
+            iframe=html.escape(redirect_uri_with_code, quote=True),
+            redirect=escapejs(bridge_courses_url),
+        )
+        return HttpResponse(
+            content=html_content.encode('utf-8'),
+            content_type='text/html; charset=utf-8'
+        )
+    
+    # Fallback: redirect to Bridge's redirect_uri (standard OIDC flow)
+    return HttpResponseRedirect(
+        f'{redirect_uri}?{urllib.parse.urlencode({"code": code, "state": state})}'
+    )
 
 
+@require_POST
 @csrf_exempt
 def token(request):
     """
@@ -177,54 +178,39 @@ def token(request):
     except (KeyError, AttributeError):
         return HttpResponseBadRequest('Missing code or authorization header')
     
-    # Verify Basic auth credentials
+    # Reject other schemes and malformed or oversized headers before decoding
+    match = _BASIC_RE.match(auth_header)
+    if not match:
+        return HttpResponseBadRequest('Malformed authorization header')
     try:
-        # Decode Basic auth
-        credentials = auth_header.replace('Basic ', '')
-        decoded = base64.b64decode(credentials).decode('utf-8')
-        client_id, client_secret = decoded.split(':')
-        
-        # Verify credentials
-        auth = OHSAuth.objects.get(client_id=client_id, is_active=True)
-        if auth.client_secret != client_secret:
-            return HttpResponseForbidden('Invalid credentials')
-    except:
+        decoded = base64.b64decode(match.group(1), validate=True)
+        # The client id cannot contain ':' (RFC 7617), the secret may
+        client_id, _, client_secret = decoded.partition(b':')
+        client_id = client_id.decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError):
+        return HttpResponseBadRequest('Malformed authorization header')
+    
+    # Verify credentials
+    auth = get_client_auth(client_id)
+    if auth is None or not hmac.compare_digest(auth.client_secret.encode('utf-8'), client_secret):
         return HttpResponseForbidden('Invalid credentials')
     
-    # Retrieve authorization code from database
-    try:
-        auth_code = OAuthAuthorizationCode.objects.get(
-            code=code,
-            used=False,
-            expires_at__gt=timezone.now()
-        )
-        account = auth_code.account
-        
-        # Mark code as used
-        auth_code.used = True
-        auth_code.save()
-    except OAuthAuthorizationCode.DoesNotExist:
+    # Consume the authorization code
+    account_id = redeem_authorization_code(code)
+    if account_id is None:
         return HttpResponseForbidden('Invalid or expired authorization code')
     
     # Generate access token
-    access_token = secrets.token_urlsafe(16)
-    
-    # Store access token in database
-    expires_at = timezone.now() + timedelta(hours=1)
-    OAuthAccessToken.objects.create(
-        token=access_token,
-        account=account,
-        client_id=client_id,
-        expires_at=expires_at
-    )
+    access_token = issue_access_token(account_id, client_id)
     
     return JsonResponse({
         'access_token': access_token,
         'token_type': 'Bearer',
-        'expires_in': 3600,
+        'expires_in': ACCESS_TOKEN_TTL,
     })
 
 
+@require_http_methods(['GET', 'POST'])
 @csrf_exempt
 def userinfo(request):
     """
@@ -234,28 +220,23 @@ def userinfo(request):
     try:
         auth_header = request.headers['Authorization']
         token_type, token = auth_header.split(' ')
-        
-        if token_type != 'Bearer':
-            return HttpResponseForbidden('Invalid token type')
-    except:
+    except (KeyError, ValueError):
         return HttpResponseForbidden('Missing or invalid authorization header')
     
-    # Retrieve user data from access token in database
-    try:
-        access_token_obj = OAuthAccessToken.objects.get(
-            token=token,
-            expires_at__gt=timezone.now()
-        )
-        account = access_token_obj.account
-    except OAuthAccessToken.DoesNotExist:
+    if token_type != 'Bearer':
+        return HttpResponseForbidden('Invalid token type')
+    
+    # Retrieve user data from access token
+    account_fields = get_access_token_claims(token)
+    if account_fields is None:
         return HttpResponseForbidden('Invalid or expired access token')
     
     claims = {
-        'uid': account.unique_id,
-        'email': account.user_email,
-        'first_name': account.first_name,
-        'family_name': account.last_name,
-        'sub': account.unique_id,  # OIDC standard subject identifier
+        'uid': account_fields['unique_id'],
+        'email': account_fields['user_email'],
+        'first_name': account_fields['first_name'],
+        'family_name': account_fields['last_name'],
+        'sub': account_fields['unique_id'],  # OIDC standard subject identifier
     }
     
     return JsonResponse(claims)
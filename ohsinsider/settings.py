@@ -94,6 +94,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests instead of reconnecting each time
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_MAX_CONN_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -139,3 +142,7 @@ REDIS = {
 }
 
 REDIS_TASK_QUEUE = 'ohsinsider:tasks'
+
+# Where OIDC authorization codes and access tokens are kept: 'database' or
+# 'redis'. Redis expires them natively and redeems codes atomically (GETDEL).
+OHS_OAUTH_STORE = os.environ.get('OHS_OAUTH_STORE', 'database')
@@ -5,7 +5,14 @@ WSGI config for OHS Insider Bridge integration.
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ohsinsider.settings')
 
 application = get_wsgi_application()
+
+# Build the URL resolver and import the views now rather than on the first
+# request (with gunicorn's preload_app this happens once, before forking)
+get_resolver().url_patterns
+
+import lms.views_openid  # noqa: E402,F401
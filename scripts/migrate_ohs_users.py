@@ -15,8 +15,15 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ohsinsider.settings')
 django.setup()
 
+from django.db import DatabaseError, connection, transaction
+
 from lms.models import OHSAccount, OHSAuth
 
+# Number of WordPress rows fetched and inserted at a time. Each batch is
+# looked up with unique_id__in, one bound parameter per row, so it must fit
+# the backend's parameter limit (999 on SQLite before 3.32)
+BATCH_SIZE = min(1000, connection.features.max_query_params or 1000)
+
 
 class OHSUserMigrator:
     def __init__(self, wp_config):
@@ -44,43 +51,54 @@ class OHSUserMigrator:
             print(f"❌ Error connecting to WordPress database: {e}")
             return False
     
-    def get_wordpress_users(self):
-        """Get users with unique IDs from WordPress."""
+    def get_wordpress_users(self, batch_size=BATCH_SIZE):
+        """Stream users with unique IDs from WordPress in batches."""
         if not self.connection:
-            return []
+            return
         
         try:
-            cursor = self.connection.cursor(dictionary=True)
+            # Unbuffered cursor streams rows from the server instead of
+            # loading the whole result set into memory
+            cursor = self.connection.cursor(dictionary=True, buffered=False)
             
-            # Query to get users with unique_id meta
+            # Query to get users with unique_id meta, pivoting the three
+            # meta keys out of a single wp_usermeta scan
             query = """
             SELECT 
                 u.ID,
                 u.user_email,
                 u.display_name,
                 u.user_registered,
-                um_unique.meta_value as unique_id,
-                um_first.meta_value as first_name,
-                um_last.meta_value as last_name
+                MAX(CASE WHEN um.meta_key = 'unique_id' THEN um.meta_value END) as unique_id,
+                MAX(CASE WHEN um.meta_key = 'first_name' THEN um.meta_value END) as first_name,
+                MAX(CASE WHEN um.meta_key = 'last_name' THEN um.meta_value END) as last_name
             FROM wp_users u
-            LEFT JOIN wp_usermeta um_unique ON u.ID = um_unique.user_id AND um_unique.meta_key = 'unique_id'
-            LEFT JOIN wp_usermeta um_first ON u.ID = um_first.user_id AND um_first.meta_key = 'first_name'
-            LEFT JOIN wp_usermeta um_last ON u.ID = um_last.user_id AND um_last.meta_key = 'last_name'
-            WHERE um_unique.meta_value IS NOT NULL
-            AND um_unique.meta_value != ''
+            JOIN wp_usermeta um ON um.user_id = u.ID
+            WHERE um.meta_key IN ('unique_id', 'first_name', 'last_name')
+            GROUP BY u.ID
+            HAVING unique_id IS NOT NULL
+            AND unique_id != ''
             ORDER BY u.user_registered DESC
             """
             
             cursor.execute(query)
-            users = cursor.fetchall()
+            total = 0
+            batch = []
+            for user in cursor:
+                batch.append(user)
+                if len(batch) >= batch_size:
+                    total += len(batch)
+                    yield batch
+                    batch = []
+            if batch:
+                total += len(batch)
+                yield batch
             cursor.close()
             
-            print(f"📊 Found {len(users)} users with unique IDs")
-            return users
+            print(f"📊 Found {total} users with unique IDs")
             
         except Error as e:
             print(f"❌ Error querying WordPress users: {e}")
-            return []
     
     def map_unique_id_to_bridge_subaccount(self, unique_id):
         """
@@ -101,17 +119,47 @@ class OHSUserMigrator:
         if not self.connect_to_wordpress():
             return False
         
-        users = self.get_wordpress_users()
-        if not users:
+        found_count = 0
+        migrated_count = 0
+        skipped_count = 0
+        error_count = 0
+        
+        print(f"\n🔄 Starting migration (dry_run={dry_run})")
+        print("=" * 50)
+        
+        for users in self.get_wordpress_users():
+            found_count += len(users)
+            created, skipped, errors = self.migrate_batch(users, dry_run)
+            migrated_count += created
+            skipped_count += skipped
+            error_count += errors
+        
+        if self.connection:
+            self.connection.close()
+        
+        if not found_count:
             print("❌ No users found to migrate")
             return False
         
+        print("\n" + "=" * 50)
+        print(f"📊 Migration Summary:")
+        print(f"   Migrated: {migrated_count}")
+        print(f"   Skipped: {skipped_count}")
+        print(f"   Errors: {error_count}")
+        
+        return True
+    
+    def migrate_batch(self, users, dry_run=True):
+        """Migrate one batch of WordPress users; returns (migrated, skipped, errors)."""
         migrated_count = 0
         skipped_count = 0
         error_count = 0
         
-        print(f"\n🔄 Starting migration (dry_run={dry_run})")
-        print("=" * 50)
+        # One existence query per batch instead of one per user
+        existing = set(OHSAccount.objects.filter(
+            unique_id__in=[user['unique_id'] for user in users]
+        ).values_list('unique_id', flat=True))
+        accounts = []
         
         for user in users:
             try:
@@ -121,7 +169,7 @@ class OHSUserMigrator:
                 last_name = user['last_name'] or ''
                 
                 # Check if account already exists
-                if OHSAccount.objects.filter(unique_id=unique_id).exists():
+                if unique_id in existing:
                     print(f"⏭️  Skipping {unique_id} - already exists")
                     skipped_count += 1
                     continue
@@ -132,33 +180,43 @@ class OHSUserMigrator:
                 if dry_run:
                     print(f"🔍 Would create: {unique_id} -> {bridge_subaccount_id} ({email})")
                 else:
-                    # Create the account
-                    account = OHSAccount.objects.create(
+                    accounts.append(OHSAccount(
                         unique_id=unique_id,
                         bridge_subaccount_id=bridge_subaccount_id,
                         user_email=email,
                         first_name=first_name,
                         last_name=last_name,
                         is_active=True
-                    )
-                    print(f"✅ Created: {unique_id} -> {bridge_subaccount_id}")
+                    ))
                 
+                existing.add(unique_id)
                 migrated_count += 1
                 
             except Exception as e:
                 print(f"❌ Error migrating user {user.get('unique_id', 'unknown')}: {e}")
                 error_count += 1
         
-        print("\n" + "=" * 50)
-        print(f"📊 Migration Summary:")
-        print(f"   Migrated: {migrated_count}")
-        print(f"   Skipped: {skipped_count}")
-        print(f"   Errors: {error_count}")
-        
-        if self.connection:
-            self.connection.close()
+        if accounts:
+            unique_ids = [account.unique_id for account in accounts]
+            try:
+                with transaction.atomic():
+                    # ignore_conflicts silently drops rows that already exist
+                    # (e.g. created since the check above), so count what was stored
+                    before = OHSAccount.objects.filter(unique_id__in=unique_ids).count()
+                    OHSAccount.objects.bulk_create(accounts, batch_size=BATCH_SIZE, ignore_conflicts=True)
+                    created = OHSAccount.objects.filter(unique_id__in=unique_ids).count() - before
+            except DatabaseError as e:
+                print(f"❌ Error creating batch of {len(accounts)} accounts: {e}")
+                migrated_count -= len(accounts)
+                error_count += len(accounts)
+            else:
+                print(f"✅ Created {created} accounts")
+                if created < len(accounts):
+                    print(f"⏭️  Skipped {len(accounts) - created} accounts - already exist")
+                    migrated_count -= len(accounts) - created
+                    skipped_count += len(accounts) - created
         
-        return True
+        return migrated_count, skipped_count, error_count
     
     def create_auth_credentials(self):
         """Create authentication credentials for WordPress integration."""
@@ -85,16 +85,21 @@ def create_sample_data():
             }
         ]
         
+        existing = set(OHSAccount.objects.filter(
+            unique_id__in=[account_data['unique_id'] for account_data in sample_accounts]
+        ).values_list('unique_id', flat=True))
+        
+        # Insert all sample accounts at once; ones that already exist are left untouched
+        OHSAccount.objects.bulk_create(
+            [OHSAccount(**account_data) for account_data in sample_accounts],
+            ignore_conflicts=True
+        )
+        
         for account_data in sample_accounts:
-            account, created = OHSAccount.objects.get_or_create(
-                unique_id=account_data['unique_id'],
-                defaults=account_data
-            )
-            
-            if created:
-                print(f"✅ Created sample account: {account.unique_id}")
+            if account_data['unique_id'] in existing:
+                print(f"ℹ️  Sample account already exists: {account_data['unique_id']}")
             else:
-                print(f"ℹ️  Sample account already exists: {account.unique_id}")
+                print(f"✅ Created sample account: {account_data['unique_id']}")
         
         return True
         
@@ -2,142 +2,305 @@
 """
 Test script for OHS Insider Bridge SSO integration.
 """
+import asyncio
+import functools
 import os
+import sqlite3
 import sys
-import requests
-import json
+import httpx
+import orjson
 import time
 import hmac
 import hashlib
-from urllib.parse import urlencode
+from urllib.parse import quote_plus
+
+from asgiref.sync import sync_to_async
 
 # Add the project directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Set up Django environment
+# Django is set up by setup_django(); --config-only on SQLite skips it
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ohsinsider.settings')
 
-import django
-django.setup()
+# Status codes each test accepts as a pass
+_OK = frozenset({200})
+_REDIRECT = frozenset({301, 302})
+
+def setup_django():
+    """Set up Django so the tester can use the ORM."""
+    import django
+    django.setup()
+
+
+def _print_config(base_url, client_id, client_secret, mapping):
+    """Print WordPress plugin configuration."""
+    print("\n📋 WordPress Plugin Configuration:")
+    print("=" * 40)
+    print(f"Django Base URL: {base_url}")
+    print(f"Client ID: {client_id}")
+    print(f"Client Secret: {client_secret}")
+    print("\nBridge Subaccount Mapping (JSON):")
+    
+    print(orjson.dumps(mapping, option=orjson.OPT_INDENT_2).decode('utf-8'))
+
+
+def print_config_from_database(base_url):
+    """
+    Print the WordPress configuration by reading the SQLite database directly,
+    without setting up Django. Returns False if the database is not SQLite.
+    """
+    from django.conf import settings
+    
+    database = settings.DATABASES['default']
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        return False
+    
+    # Table names are hard-coded and must match Meta.db_table on OHSAuth and
+    # OHSAccount; the models cannot be imported without setting up Django
+    connection = sqlite3.connect(database['NAME'])
+    try:
+        auth = connection.execute(
+            'SELECT client_id, client_secret FROM ohs_auth WHERE is_active = 1 ORDER BY id LIMIT 1'
+        ).fetchone()
+        if not auth:
+            print("❌ No active authentication found. Run setup_local.py first.")
+            sys.exit(1)
+        mapping = dict(connection.execute(
+            'SELECT unique_id, bridge_subaccount_id FROM ohs_account ORDER BY unique_id'
+        ))
+    finally:
+        connection.close()
+    
+    _print_config(base_url, auth[0], auth[1], mapping)
+    return True
+
 
-from lms.models import OHSAccount, OHSAuth
+def _brief(response, limit=256):
+    """Return the start of a response body for failure messages."""
+    return response.content[:limit].decode('utf-8', errors='replace')
+
+
+def _canonical(data):
+    """
+    Encode a login notification the way the server verifies it: fields in
+    sorted key order (see lms.views.canonical_querystring).
+    """
+    return (
+        f"bridge_subaccount_id={quote_plus(data['bridge_subaccount_id'])}"
+        f"&email={quote_plus(data['email'])}"
+        f"&first_name={quote_plus(data['first_name'])}"
+        f"&last_name={quote_plus(data['last_name'])}"
+        f"&timestamp={data['timestamp']}"
+        f"&unique_id={quote_plus(data['unique_id'])}"
+    )
 
 
 class OHSIntegrationTester:
     def __init__(self, base_url='http://localhost:8000'):
+        from lms.models import OHSAccount, OHSAuth
+        
         self.base_url = base_url
         self.auth = OHSAuth.objects.filter(is_active=True).first()
         
         if not self.auth:
             print("❌ No active authentication found. Run setup_local.py first.")
             sys.exit(1)
+        self._secret_bytes = self.auth.client_secret.encode('utf-8')
+        # Keyed once; copies reuse the precomputed inner/outer pads
+        self._hmac_template = hmac.new(self._secret_bytes, None, hashlib.sha256)
+        # Reused by sign_one() to build each signed message without new bytes objects
+        self._sig_buf = bytearray()
+        
+        # Sample account shared by the tests, with only the fields they send
+        self.sample_account = OHSAccount.objects.only(
+            'unique_id', 'user_email', 'first_name', 'last_name', 'bridge_subaccount_id'
+        ).first()
+        
+        # Async HTTP client shared by the tests, opened by run_all_tests
+        self.client = None
+    
+    def _sign(self, message):
+        """Return the hex HMAC-SHA256 of message (bytes-like) under the client secret."""
+        h = self._hmac_template.copy()
+        h.update(message)
+        return h.hexdigest()
     
-    def test_health_check(self):
+    def _notification_data(self, account, timestamp):
+        """Return the unsigned login notification fields for an account."""
+        return {
+            'unique_id': account.unique_id,
+            'email': account.user_email,
+            'first_name': account.first_name,
+            'last_name': account.last_name,
+            'bridge_subaccount_id': account.bridge_subaccount_id,
+            'timestamp': timestamp
+        }
+    
+    def sign_batch(self, accounts, timestamp=None):
+        """
+        Return login notification signatures for many accounts (for load tests),
+        signed from the keyed HMAC template.
+        """
+        if timestamp is None:
+            timestamp = int(time.time())
+        timestamp = str(timestamp).encode('ascii')
+        return [self.sign_one(account, timestamp) for account in accounts]
+    
+    def sign_one(self, account, timestamp):
+        """
+        Sign one account's login notification (same encoding as _canonical),
+        assembling the message in a reused buffer. Not thread-safe.
+        """
+        if not isinstance(timestamp, bytes):
+            timestamp = str(timestamp).encode('ascii')
+        buf = self._sig_buf
+        del buf[:]
+        buf.extend(b'bridge_subaccount_id=')
+        buf.extend(quote_plus(account.bridge_subaccount_id).encode('ascii'))
+        buf.extend(b'&email=')
+        buf.extend(quote_plus(account.user_email).encode('ascii'))
+        buf.extend(b'&first_name=')
+        buf.extend(quote_plus(account.first_name).encode('ascii'))
+        buf.extend(b'&last_name=')
+        buf.extend(quote_plus(account.last_name).encode('ascii'))
+        buf.extend(b'&timestamp=')
+        buf.extend(timestamp)
+        buf.extend(b'&unique_id=')
+        buf.extend(quote_plus(account.unique_id).encode('ascii'))
+        return self._sign(buf)
+    
+    async def test_health_check(self):
         """Test health check endpoint."""
-        print("🔍 Testing health check endpoint...")
+        output = ["🔍 Testing health check endpoint..."]
         
         try:
-            response = requests.get(f"{self.base_url}/health/", timeout=10)
-            if response.status_code == 200:
-                print("✅ Health check passed")
-                return True
+            response = await self.client.get("/health/")
+            if response.status_code in _OK:
+                output.append("✅ Health check passed")
+                return True, '\n'.join(output)
             else:
-                print(f"❌ Health check failed: {response.status_code}")
-                return False
+                output.append(f"❌ Health check failed: {response.status_code}")
+                return False, '\n'.join(output)
         except Exception as e:
-            print(f"❌ Health check error: {e}")
-            return False
+            output.append(f"❌ Health check error: {e}")
+            return False, '\n'.join(output)
     
-    def test_wordpress_notification(self):
+    async def test_wordpress_notification(self):
         """Test WordPress login notification endpoint."""
-        print("\n🔍 Testing WordPress login notification...")
+        output = ["🔍 Testing WordPress login notification..."]
         
-        # Get a sample account
-        account = OHSAccount.objects.first()
+        account = self.sample_account
         if not account:
-            print("❌ No sample accounts found. Run setup_local.py first.")
-            return False
-        
-        # Create test data
-        data = {
-            'unique_id': account.unique_id,
-            'email': account.user_email,
-            'first_name': account.first_name,
-            'last_name': account.last_name,
-            'bridge_subaccount_id': account.bridge_subaccount_id,
-            'timestamp': int(time.time())
-        }
+            output.append("❌ No sample accounts found. Run setup_local.py first.")
+            return False, '\n'.join(output)
         
-        # Create signature
-        data_string = urlencode(data, doseq=True)
-        signature = hmac.new(
-            self.auth.client_secret.encode('utf-8'),
-            data_string.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        data['signature'] = signature
+        # Create signed test data
+        data = self._notification_data(account, int(time.time()))
+        data['signature'] = self._sign(_canonical(data).encode('utf-8'))
         
         try:
-            response = requests.post(
-                f"{self.base_url}/onlogin/",
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
+            # Serialized once to compact JSON
+            response = await self.client.post(
+                "/onlogin/",
+                content=orjson.dumps(data),
+                headers={'Content-Type': 'application/json'}
             )
             
-            if response.status_code == 200:
-                print("✅ WordPress notification test passed")
-                return True
+            if response.status_code in _OK:
+                output.append("✅ WordPress notification test passed")
+                return True, '\n'.join(output)
             else:
-                print(f"❌ WordPress notification failed: {response.status_code} - {response.text}")
-                return False
+                output.append(f"❌ WordPress notification failed: {response.status_code} - {_brief(response)}")
+                return False, '\n'.join(output)
         except Exception as e:
-            print(f"❌ WordPress notification error: {e}")
-            return False
+            output.append(f"❌ WordPress notification error: {e}")
+            return False, '\n'.join(output)
     
-    def test_user_authentication(self):
+    async def test_user_authentication(self):
         """Test user authentication endpoint."""
-        print("\n🔍 Testing user authentication...")
+        output = ["🔍 Testing user authentication..."]
         
-        # Get a sample account
-        account = OHSAccount.objects.first()
+        account = self.sample_account
         if not account:
-            print("❌ No sample accounts found.")
-            return False
+            output.append("❌ No sample accounts found.")
+            return False, '\n'.join(output)
         
         try:
-            response = requests.get(
-                f"{self.base_url}/auth/{account.unique_id}/",
-                allow_redirects=False,
-                timeout=10
+            response = await self.client.get(
+                f"/auth/{account.unique_id}/",
+                follow_redirects=False
             )
             
-            if response.status_code in [302, 301]:  # Redirect response
-                print("✅ User authentication test passed (redirect received)")
-                print(f"   Redirect URL: {response.headers.get('Location', 'N/A')}")
-                return True
+            if response.status_code in _REDIRECT:
+                output.append("✅ User authentication test passed (redirect received)")
+                output.append(f"   Redirect URL: {response.headers.get('Location', 'N/A')}")
+                return True, '\n'.join(output)
             else:
-                print(f"❌ User authentication failed: {response.status_code} - {response.text}")
-                return False
+                output.append(f"❌ User authentication failed: {response.status_code} - {_brief(response)}")
+                return False, '\n'.join(output)
         except Exception as e:
-            print(f"❌ User authentication error: {e}")
-            return False
+            output.append(f"❌ User authentication error: {e}")
+            return False, '\n'.join(output)
     
-    def test_admin_access(self):
+    async def test_admin_access(self):
         """Test Django admin access."""
-        print("\n🔍 Testing Django admin access...")
+        output = ["🔍 Testing Django admin access..."]
+        
+        try:
+            response = await self.client.get("/admin/")
+            if response.status_code in _OK:
+                output.append("✅ Django admin accessible")
+                return True, '\n'.join(output)
+            else:
+                output.append(f"❌ Django admin not accessible: {response.status_code}")
+                return False, '\n'.join(output)
+        except Exception as e:
+            output.append(f"❌ Django admin error: {e}")
+            return False, '\n'.join(output)
+    
+    def _code_redemption_plan(self):
+        """Return SQLite's query plan for code redemption, or None on other backends."""
+        from django.db import connection
+        from lms.services import REDEEM_AUTHORIZATION_CODE_SQL
+        
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN QUERY PLAN {REDEEM_AUTHORIZATION_CODE_SQL}',
+                [True, None, b'', None]
+            )
+            return ' '.join(row[-1] for row in cursor.fetchall())
+    
+    async def test_code_redemption_plan(self):
+        """Test that code redemption searches the unused-code index."""
+        output = ["🔍 Testing code redemption query plan..."]
         
         try:
-            response = requests.get(f"{self.base_url}/admin/", timeout=10)
-            if response.status_code == 200:
-                print("✅ Django admin accessible")
-                return True
+            plan = await sync_to_async(self._code_redemption_plan)()
+            if plan is None:
+                output.append("✅ Query plan check skipped (database is not SQLite)")
+                return True, '\n'.join(output)
+            elif 'USING INDEX oauth_code_unused_idx' in plan:
+                output.append("✅ Code redemption uses oauth_code_unused_idx")
+                return True, '\n'.join(output)
             else:
-                print(f"❌ Django admin not accessible: {response.status_code}")
-                return False
+                output.append(f"❌ Code redemption does not use oauth_code_unused_idx: {plan}")
+                return False, '\n'.join(output)
         except Exception as e:
-            print(f"❌ Django admin error: {e}")
-            return False
+            output.append(f"❌ Query plan error: {e}")
+            return False, '\n'.join(output)
+    
+    async def _gather(self, test_funcs):
+        """Run the independent tests concurrently on one client."""
+        # Over HTTPS the tests share a single multiplexed HTTP/2 connection
+        async with httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=True,
+            timeout=10,
+            follow_redirects=True,
+        ) as self.client:
+            return await asyncio.gather(*(test_func() for test_func in test_funcs))
     
     def run_all_tests(self):
         """Run all integration tests."""
@@ -149,15 +312,15 @@ class OHSIntegrationTester:
             ("WordPress Notification", self.test_wordpress_notification),
             ("User Authentication", self.test_user_authentication),
             ("Django Admin", self.test_admin_access),
+            ("Code Redemption Plan", self.test_code_redemption_plan),
         ]
         
-        passed = 0
         total = len(tests)
         
-        for test_name, test_func in tests:
-            if test_func():
-                passed += 1
-            print()  # Add spacing between tests
+        # Each test returns (passed, output); the output is written once, in test order
+        results = asyncio.run(self._gather(test_func for _, test_func in tests))
+        passed = sum(1 for ok, _ in results if ok)
+        sys.stdout.write('\n\n'.join(output for _, output in results) + '\n\n')
         
         print("=" * 50)
         print(f"📊 Test Results: {passed}/{total} tests passed")
@@ -169,20 +332,18 @@ class OHSIntegrationTester:
         
         return passed == total
     
+    @functools.cached_property
+    def mapping(self):
+        """Unique ID to Bridge subaccount mapping, loaded once per tester."""
+        from lms.models import OHSAccount
+        
+        return dict(
+            OHSAccount.objects.values_list('unique_id', 'bridge_subaccount_id').iterator(chunk_size=2000)
+        )
+    
     def print_wordpress_config(self):
         """Print WordPress plugin configuration."""
-        print("\n📋 WordPress Plugin Configuration:")
-        print("=" * 40)
-        print(f"Django Base URL: {self.base_url}")
-        print(f"Client ID: {self.auth.client_id}")
-        print(f"Client Secret: {self.auth.client_secret}")
-        print("\nBridge Subaccount Mapping (JSON):")
-        
-        mapping = {}
-        for account in OHSAccount.objects.all():
-            mapping[account.unique_id] = account.bridge_subaccount_id
-        
-        print(json.dumps(mapping, indent=2))
+        _print_config(self.base_url, self.auth.client_id, self.auth.client_secret, self.mapping)
 
 
 def main():
@@ -197,6 +358,11 @@ def main():
     
     args = parser.parse_args()
     
+    # The configuration is two small queries; skip Django setup when possible
+    if args.config_only and print_config_from_database(args.base_url):
+        return
+    
+    setup_django()
     tester = OHSIntegrationTester(args.base_url)
     
     if args.config_only: